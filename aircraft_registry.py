@@ -0,0 +1,175 @@
+import csv
+import mmap
+import os
+import struct
+from functools import lru_cache
+
+"""
+    AircraftRegistry class:
+        - Looks up the category of an aircraft (small/large fixed wing, rotorcraft)
+          from its 24-bit ICAO hex ID
+        - Backed by a binary table of fixed size records sorted by hex ID,
+          memory-mapped and binary searched
+        - Results are kept in an LRU cache, repeat lookups cost nothing
+
+    build_registry():
+        - Converts a registry CSV (e.g. FAA MASTER.txt, optionally joined with
+          ACFTREF.txt for the weight class) into the binary table
+        - Run directly: python aircraft_registry.py MASTER.txt registry.bin --acftref ACFTREF.txt
+"""
+
+CATEGORY_UNKNOWN = 0
+CATEGORY_SMALL_FIXED_WING = 1
+CATEGORY_LARGE_FIXED_WING = 2
+CATEGORY_ROTORCRAFT = 3
+
+# hex id, category
+RECORD_STRUCT = struct.Struct("<IB")
+
+# FAA "TYPE AIRCRAFT" codes
+ROTORCRAFT_TYPES = ("6", "9")
+FIXED_WING_TYPES = ("4", "5")
+MULTI_ENGINE_TYPE = "5"
+
+# FAA ACFTREF "AC-WEIGHT" classes of 12,500 lbs and over, CLASS 4 is UAVs up to 55 lbs
+LARGE_WEIGHT_CLASSES = ("CLASS 2", "CLASS 3")
+
+
+class AircraftRegistry:
+    def __init__(self, registry_path: str, cache_size: int = 4096):
+        self.registry_file = open(registry_path, "rb")
+
+        try:
+            self.registry_map = mmap.mmap(self.registry_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty registry
+            self.registry_map = None
+
+        self.total_records = 0
+        if self.registry_map is not None:
+            self.total_records = len(self.registry_map) // RECORD_STRUCT.size
+
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _lookup(self, hex_ident: str) -> int:
+        try:
+            hex_int = int(hex_ident, 16)
+        except ValueError:
+            return CATEGORY_UNKNOWN
+
+        low = 0
+        high = self.total_records - 1
+
+        while low <= high:
+            mid = (low + high) // 2
+            record_hex, category = RECORD_STRUCT.unpack_from(
+                self.registry_map, mid * RECORD_STRUCT.size
+            )
+
+            if record_hex == hex_int:
+                return category
+
+            if record_hex < hex_int:
+                low = mid + 1
+            else:
+                high = mid - 1
+
+        return CATEGORY_UNKNOWN
+
+    def close(self):
+        if self.registry_map is not None:
+            self.registry_map.close()
+
+        self.registry_file.close()
+
+
+def get_category(type_aircraft: str, weight_class: str | None) -> int:
+    if type_aircraft in ROTORCRAFT_TYPES:
+        return CATEGORY_ROTORCRAFT
+
+    if type_aircraft not in FIXED_WING_TYPES:
+        return CATEGORY_UNKNOWN
+
+    # Prefer the weight class when the aircraft reference file is available
+    if weight_class is not None:
+        if weight_class in LARGE_WEIGHT_CLASSES:
+            return CATEGORY_LARGE_FIXED_WING
+
+        return CATEGORY_SMALL_FIXED_WING
+
+    # Without it, treat multi engine aircraft as large
+    if type_aircraft == MULTI_ENGINE_TYPE:
+        return CATEGORY_LARGE_FIXED_WING
+
+    return CATEGORY_SMALL_FIXED_WING
+
+
+def read_weight_classes(acftref_path: str) -> dict[str, str]:
+    weight_classes = {}
+
+    with open(acftref_path, encoding="utf-8-sig", newline="") as acftref_file:
+        for row in csv.DictReader(acftref_file):
+            row = {key.strip(): (value or "").strip() for key, value in row.items() if key}
+            weight_classes[row.get("CODE", "")] = row.get("AC-WEIGHT", "")
+
+    return weight_classes
+
+
+def build_registry(
+    csv_path: str,
+    registry_path: str,
+    acftref_path: str | None = None,
+    hex_column: str = "MODE S CODE HEX",
+    type_column: str = "TYPE AIRCRAFT",
+    model_column: str = "MFR MDL CODE",
+) -> int:
+    weight_classes = None
+    if acftref_path:
+        weight_classes = read_weight_classes(acftref_path)
+
+    records = {}
+    with open(csv_path, encoding="utf-8-sig", newline="") as csv_file:
+        for row in csv.DictReader(csv_file):
+            row = {key.strip(): (value or "").strip() for key, value in row.items() if key}
+
+            try:
+                hex_int = int(row[hex_column], 16)
+            except (KeyError, ValueError):
+                continue
+
+            weight_class = None
+            if weight_classes is not None:
+                weight_class = weight_classes.get(row.get(model_column, ""), "")
+
+            category = get_category(row.get(type_column, ""), weight_class)
+
+            if category != CATEGORY_UNKNOWN:
+                records[hex_int] = category
+
+    # Write to a temporary file so a running tracker never maps a partial table
+    tmp_path = registry_path + ".tmp"
+    with open(tmp_path, "wb") as registry_file:
+        for hex_int in sorted(records):
+            registry_file.write(RECORD_STRUCT.pack(hex_int, records[hex_int]))
+
+    os.replace(tmp_path, registry_path)
+
+    return len(records)
+
+
+def main():
+    # Only needed when run directly, keeps it out of the display's startup
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the aircraft registry table from a registry CSV")
+    parser.add_argument("csv_path", help="Registry CSV, e.g. FAA MASTER.txt")
+    parser.add_argument("registry_path", help="Output binary table")
+    parser.add_argument("--acftref", help="FAA ACFTREF.txt for weight classes")
+    args = parser.parse_args()
+
+    total = build_registry(args.csv_path, args.registry_path, args.acftref)
+    print(f"Wrote {total} aircraft to {args.registry_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+from PIL import Image, ImageDraw, ImageFont
+from collections import OrderedDict
+import numpy as np
+
+"""
+    LabelCache class:
+        - Holds pre-rasterized callsign masks (uint8 arrays) so the font only has
+          to lay out a callsign the first time it is seen
+        - Least recently used masks are evicted once max_size is reached
+
+    LabelPlacer class:
+        - Picks a non-overlapping position for each callsign label
+        - Uses a uniform spatial hash grid so each frame is roughly linear in
+          the number of labels
+        - Labels are placed in priority order, labels that don't fit are dropped
+"""
+
+
+class LabelCache:
+    def __init__(self, font: ImageFont.FreeTypeFont, max_size: int = 256):
+        self.font = font
+        self.max_size = max_size
+        self.labels: OrderedDict[str, np.ndarray] = OrderedDict()
+
+    def get(self, text: str) -> np.ndarray | None:
+        label = self.labels.get(text)
+
+        if label is not None:
+            self.labels.move_to_end(text)
+            return label
+
+        label = self.render(text)
+
+        if label is None:
+            return None
+
+        self.labels[text] = label
+
+        # Evict the least recently used label
+        if len(self.labels) > self.max_size:
+            self.labels.popitem(last=False)
+
+        return label
+
+    def render(self, text: str) -> np.ndarray | None:
+        left, top, right, bottom = self.font.getbbox(text)
+
+        if right <= left or bottom <= top:
+            return None
+
+        # Render as an "L" mask so it can be drawn in any color
+        label = Image.new("L", (right - left, bottom - top))
+        ImageDraw.Draw(label).text((-left, -top), text, fill=255, font=self.font)
+
+        return np.array(label)
+
+    def clear(self):
+        self.labels.clear()
+
+
+class LabelPlacer:
+    def __init__(
+        self,
+        frame_dims: tuple[int, int],
+        cell_size: int = 8,
+        icon_half_size: int = 2,
+    ):
+        self.width = frame_dims[0]
+        self.height = frame_dims[1]
+        self.cell_size = cell_size
+        self.icon_half_size = icon_half_size
+        self.grid: dict[tuple[int, int], list[tuple[int, int, int, int]]] = {}
+
+    def place(
+        self,
+        labels: list[tuple[tuple[int, int], np.ndarray]],
+        obstacles: list[tuple[int, int]],
+    ) -> list[tuple[tuple[int, int], np.ndarray]]:
+        """
+        labels - list of ((x, y), label mask) for each aircraft, highest priority first
+        obstacles - (x, y) of every visible aircraft, including the ones without a label
+
+        Returns a list of (top left corner, label mask) for the labels that fit
+        """
+        self.grid.clear()
+
+        # Aircraft icons are obstacles, labels should not cover other aircraft
+        for pos in obstacles:
+            self._insert(
+                (
+                    pos[0] - self.icon_half_size,
+                    pos[1] - self.icon_half_size,
+                    pos[0] + self.icon_half_size + 1,
+                    pos[1] + self.icon_half_size + 1,
+                )
+            )
+
+        placed = []
+        for pos, label in labels:
+            for corner in self._candidates(pos, (label.shape[1], label.shape[0])):
+                rect = (
+                    corner[0],
+                    corner[1],
+                    corner[0] + label.shape[1],
+                    corner[1] + label.shape[0],
+                )
+
+                if self._in_frame(rect) and not self._collides(rect):
+                    self._insert(rect)
+                    placed.append((corner, label))
+                    break
+
+        return placed
+
+    def _candidates(self, pos: tuple[int, int], size: tuple[int, int]):
+        # Anchors around the icon, starting with the upper left position
+        # the labels were originally drawn at
+        offset = self.icon_half_size + 1
+        x, y = pos
+        w, h = size
+
+        return (
+            (x - offset - w + 1, y - offset - h + 1),
+            (x + offset, y - offset - h + 1),
+            (x - offset - w + 1, y + offset),
+            (x + offset, y + offset),
+        )
+
+    def _in_frame(self, rect: tuple[int, int, int, int]) -> bool:
+        return (
+            rect[0] >= 0
+            and rect[1] >= 0
+            and rect[2] <= self.width
+            and rect[3] <= self.height
+        )
+
+    def _cells(self, rect: tuple[int, int, int, int]):
+        x0 = rect[0] // self.cell_size
+        y0 = rect[1] // self.cell_size
+        x1 = (rect[2] - 1) // self.cell_size
+        y1 = (rect[3] - 1) // self.cell_size
+
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                yield (cx, cy)
+
+    def _insert(self, rect: tuple[int, int, int, int]):
+        for cell in self._cells(rect):
+            self.grid.setdefault(cell, []).append(rect)
+
+    def _collides(self, rect: tuple[int, int, int, int]) -> bool:
+        for cell in self._cells(rect):
+            for other in self.grid.get(cell, ()):
+                if (
+                    rect[0] < other[2]
+                    and other[0] < rect[2]
+                    and rect[1] < other[3]
+                    and other[1] < rect[3]
+                ):
+                    return True
+
+        return False
@@ -0,0 +1,148 @@
+from PIL import Image
+from icons.icons import AircraftIcon
+from array import array
+import numpy as np
+
+"""
+    FrameCompositor class:
+        - Renders frames into a preallocated (rows, cols, 3) uint8 buffer instead
+          of making an ImageDraw call for every point, line, icon and label
+        - Traces and icons are queued while walking the aircraft table, then drawn
+          in bulk with NumPy index arrays. Each trace is queued with one call, the
+          points and segments are worked out for every trace at once
+        - get_image() wraps the buffer with a single Image.frombuffer call. Pillow
+          stores RGB as 4 bytes per pixel so this is one C copy, not a true zero-copy map
+"""
+
+
+class FrameCompositor:
+    def __init__(self, rows: int, cols: int):
+        self.rows = rows
+        self.cols = cols
+        self.frame = np.zeros((rows, cols, 3), dtype=np.uint8)
+
+        # Flattened (x, y, r, g, b) of every queued trace point, one trace after another
+        self.trace_points = array("i")
+        self.trace_lengths: list[int] = []
+
+        # (icon set, heading index) -> list of (x, y, r, g, b)
+        self.icons: dict[tuple[AircraftIcon, int], list[tuple[int, int, int, int, int]]] = {}
+
+    def begin(self, background: np.ndarray):
+        np.copyto(self.frame, background)
+        del self.trace_points[:]
+        self.trace_lengths.clear()
+        self.icons.clear()
+
+    def add_trace(
+        self,
+        history: array,
+        pos: tuple[int, int],
+        color: tuple[int, int, int],
+    ):
+        """
+        history - flattened (x, y, r, g, b) of each earlier position of the aircraft
+        pos - current position of the aircraft, only connected to the trace if it jumped
+        """
+        self.trace_points.extend(history)
+        self.trace_points.extend((pos[0], pos[1], color[0], color[1], color[2]))
+        self.trace_lengths.append(len(history) // 5 + 1)
+
+    def add_icon(
+        self,
+        icon_set: AircraftIcon,
+        pos: tuple[int, int],
+        color: tuple[int, int, int],
+        heading: int,
+    ):
+        # Ensure the heading is valid
+        if heading > 360 or heading < 0:
+            print("Invalid Heading, Aircraft not added")
+            return
+
+        key = (icon_set, icon_set.heading_index(heading))
+        self.icons.setdefault(key, []).append((pos[0], pos[1], color[0], color[1], color[2]))
+
+    def draw_traces(self):
+        if not self.trace_lengths:
+            return
+
+        points = np.array(self.trace_points, dtype=np.int32).reshape(-1, 5)
+        lengths = np.array(self.trace_lengths)
+        ends = np.cumsum(lengths)
+
+        is_first = np.zeros(len(points), dtype=bool)
+        is_first[ends - lengths] = True
+        is_last = np.zeros(len(points), dtype=bool)
+        is_last[ends - 1] = True
+
+        # Points more than a pixel from the previous point of their trace are connected to it
+        prev_xy = np.roll(points[:, 0:2], 1, axis=0)
+        jumped = (np.abs(points[:, 0:2] - prev_xy) > 1).any(axis=1) & ~is_first
+        starts = np.where(jumped[:, None], prev_xy, points[:, 0:2])
+
+        # The current position is drawn by the icon, only the line leading to it is needed
+        keep = ~is_last | jumped
+
+        # (x0, y0, x1, y1, r, g, b) of each segment, a point is a segment with matching ends
+        segments = np.hstack((starts, points))[keep]
+        self.draw_segments(segments)
+
+    def draw_segments(self, segments: np.ndarray):
+        if len(segments) == 0:
+            return
+
+        x0 = segments[:, 0]
+        y0 = segments[:, 1]
+        dx = segments[:, 2] - x0
+        dy = segments[:, 3] - y0
+
+        # Sample every segment once per pixel along its major axis
+        steps = np.maximum(np.abs(dx), np.abs(dy))
+        counts = steps + 1
+        seg_idx = np.repeat(np.arange(len(segments)), counts)
+        t = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        t_prop = t / np.maximum(steps, 1)[seg_idx]
+
+        xs = x0[seg_idx] + np.rint(dx[seg_idx] * t_prop).astype(np.int32)
+        ys = y0[seg_idx] + np.rint(dy[seg_idx] * t_prop).astype(np.int32)
+
+        valid = (xs >= 0) & (xs < self.cols) & (ys >= 0) & (ys < self.rows)
+        self.frame[ys[valid], xs[valid]] = segments[seg_idx[valid], 4:7]
+
+    def draw_icons(self):
+        for (icon_set, heading_index), entries in self.icons.items():
+            offs_y, offs_x, alpha = icon_set.icon_masks[heading_index]
+            entries = np.array(entries, dtype=np.int32)
+
+            # (aircraft, icon pixel) grids of frame coordinates
+            ys = entries[:, 1:2] + offs_y
+            xs = entries[:, 0:1] + offs_x
+            colors = np.broadcast_to(entries[:, None, 2:5], ys.shape + (3,))
+            alphas = np.broadcast_to(alpha, ys.shape)
+
+            valid = (xs >= 0) & (xs < self.cols) & (ys >= 0) & (ys < self.rows)
+            ys = ys[valid]
+            xs = xs[valid]
+
+            self.frame[ys, xs] = self._blend(self.frame[ys, xs], colors[valid], alphas[valid][:, None])
+
+    def draw_mask(self, corner: tuple[int, int], mask: np.ndarray, color: tuple[int, int, int]):
+        x0 = max(corner[0], 0)
+        y0 = max(corner[1], 0)
+        x1 = min(corner[0] + mask.shape[1], self.cols)
+        y1 = min(corner[1] + mask.shape[0], self.rows)
+
+        if x1 <= x0 or y1 <= y0:
+            return
+
+        region = self.frame[y0:y1, x0:x1]
+        alpha = mask[y0 - corner[1] : y1 - corner[1], x0 - corner[0] : x1 - corner[0], None]
+        region[:] = self._blend(region, np.array(color, dtype=np.uint16), alpha.astype(np.uint16))
+
+    def get_image(self) -> Image.Image:
+        return Image.frombuffer("RGB", (self.cols, self.rows), self.frame, "raw", "RGB", 0, 1)
+
+    def _blend(self, current: np.ndarray, color: np.ndarray, alpha: np.ndarray) -> np.ndarray:
+        blended = (color * alpha + current.astype(np.uint16) * (255 - alpha)) // 255
+        return blended.astype(np.uint8)
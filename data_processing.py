@@ -1,20 +1,88 @@
 import socket
-from prettytable import PrettyTable
 import threading
-from collections import deque
+from collections import deque, OrderedDict
+from array import array
 from typing import Dict
 import time
 
 AIRCRAFT_DICT_LOCK = threading.Lock()
 
 
+class Geofence:
+    def __init__(
+        self,
+        min_lat: float,
+        max_lat: float,
+        min_lon: float,
+        max_lon: float,
+        min_alt: int | None = None,
+        max_alt: int | None = None,
+    ):
+        self.min_lat = min_lat
+        self.max_lat = max_lat
+        self.min_lon = min_lon
+        self.max_lon = max_lon
+        self.min_alt = min_alt
+        self.max_alt = max_alt
+
+    def contains(self, lat: float, lon: float, alt: int | None = None) -> bool:
+        if lat < self.min_lat or lat > self.max_lat:
+            return False
+
+        if lon < self.min_lon or lon > self.max_lon:
+            return False
+
+        # The altitude band is only checked once the altitude is known
+        if alt is not None:
+            if self.min_alt is not None and alt < self.min_alt:
+                return False
+
+            if self.max_alt is not None and alt > self.max_alt:
+                return False
+
+        return True
+
+
 class Aircraft_Table:
-    def __init__(self, aircraft_timeout=60):
+    def __init__(
+        self,
+        aircraft_timeout=60,
+        track_log=None,
+        registry=None,
+        geofence=None,
+        max_pending=1024,
+        max_removed=1024,
+    ):
         # self.aircraft_table : Dict[str, Aircraft] = {}
         self.aircraft_table = {}
         self.total_messages = 0
         self.aircraft_timeout = aircraft_timeout
 
+        # Optional track_log.TrackLog that position updates are written to
+        self.track_log = track_log
+
+        # Optional aircraft_registry.AircraftRegistry used to categorize new aircraft
+        self.registry = registry
+
+        # Position history restored from the track log, picked up when the aircraft is first seen
+        self.restored_history = {}
+
+        # Optional Geofence, aircraft are only added to the table once a position puts them inside it
+        self.geofence = geofence
+
+        # Aircraft outside of the geofence, hex id -> last callsign. Least recently heard are evicted
+        self.pending = OrderedDict()
+        self.max_pending = max_pending
+
+        # Incremented on every change to the table, each aircraft records the sequence number of its
+        # last update so readers can ask for the changes since a sequence number
+        self.seq = 0
+
+        # (seq, hex id) of recently removed aircraft. Changes since a sequence number older than
+        # removed_floor can't be listed, those readers need a full snapshot
+        self.removed = deque(maxlen=max_removed)
+        self.removed_floor = 0
+
     def process_msg(self, msg: str):
         """
         MSG Fields:
@@ -69,9 +137,20 @@ class Aircraft_Table:
 
         aircraft = self.aircraft_table.get(hex_id)
 
+        # Filter out aircraft outside of the geofence before doing any other work
+        if self.geofence and not self.check_geofence(
+            hex_id, aircraft, callsign, altitude, latitude, longitude
+        ):
+            return
+
         # Create a new aircraft if it doesn't exist in the aircraft table
         if not aircraft:
             aircraft = Aircraft(hex_id)
+            aircraft.pos_history = self.restored_history.pop(hex_id, array("i"))
+            aircraft.call_sign = self.pending.pop(hex_id, "")
+
+            if self.registry:
+                aircraft.category = self.registry.lookup(hex_id)
 
             # Add aircraft to table
             self.aircraft_table[hex_id] = aircraft
@@ -81,6 +160,7 @@ class Aircraft_Table:
 
         if altitude:
             aircraft.altitude = int(altitude)
+            aircraft.altitude_known = True
 
         if ground_speed:
             aircraft.ground_speed = int(ground_speed)
@@ -106,8 +186,54 @@ class Aircraft_Table:
         if is_on_ground:
             aircraft.on_ground = bool(int(is_on_ground))
 
+        # Log position updates
+        if self.track_log and latitude and longitude:
+            self.track_log.append(
+                hex_id,
+                aircraft.latitude,
+                aircraft.longitude,
+                aircraft.altitude,
+                aircraft.ground_speed,
+                aircraft.track,
+            )
+
         aircraft.updated = time.time()
         self.total_messages += 1
+        self.seq += 1
+        aircraft.seq = self.seq
+
+    def check_geofence(self, hex_id, aircraft, callsign, altitude, latitude, longitude) -> bool:
+        """
+        Returns True if the message should be processed. Messages without a
+        position are only processed for aircraft already in the table
+        """
+        if latitude and longitude:
+            if altitude:
+                alt = int(altitude)
+            elif aircraft and aircraft.altitude_known:
+                alt = aircraft.altitude
+            else:
+                alt = None
+
+            if self.geofence.contains(float(latitude), float(longitude), alt):
+                return True
+
+            # Aircraft left the geofence, stop tracking it
+            if aircraft:
+                self.remove_aircraft(hex_id)
+                callsign = callsign or aircraft.call_sign
+
+        elif aircraft:
+            return True
+
+        # Hold on to the callsign so it is available if the aircraft enters the geofence
+        self.pending[hex_id] = callsign or self.pending.get(hex_id, "")
+        self.pending.move_to_end(hex_id)
+
+        if len(self.pending) > self.max_pending:
+            self.pending.popitem(last=False)
+
+        return False
 
     def purge_old_aircraft(self):
         cur_time = time.time()
@@ -122,7 +248,19 @@ class Aircraft_Table:
                 deletable.append(key)
 
         for key in deletable:
-            del self.aircraft_table[key]
+            self.remove_aircraft(key)
+
+    def remove_aircraft(self, hex_id: str):
+        if hex_id not in self.aircraft_table:
+            return
+
+        del self.aircraft_table[hex_id]
+
+        self.seq += 1
+        if len(self.removed) == self.removed.maxlen:
+            self.removed_floor = self.removed[0][0]
+
+        self.removed.append((self.seq, hex_id))
 
 
 class Aircraft:
@@ -130,6 +268,8 @@ class Aircraft:
         self.hex_ident = hex_ident
         self.call_sign: str = ""
         self.altitude: int = 0
+        # Position messages may not carry an altitude, 0 is only real once one has been received
+        self.altitude_known: bool = False
         self.ground_speed: int = 0
         self.track: int = 0
         self.latitude: float = 0.0
@@ -138,8 +278,14 @@ class Aircraft:
         self.squawk: str = ""
         self.emergency: bool = False
         self.on_ground: bool = False
+        # Aircraft_Table sequence number of the last update
+        self.seq: int = 0
+        # aircraft_registry category, 0 if unknown
+        self.category: int = 0
         self.updated = time.time()
-        self.pos_history: list[tuple[tuple[int, int], tuple[int, int, int]]] = []
+        # Flattened (x, y, r, g, b) of each screen position the aircraft has been drawn at,
+        # kept as an int array so the compositor can take a whole trace at once
+        self.pos_history = array("i")
 
     def serialize(self) -> list:
         return [
@@ -192,6 +338,10 @@ class Process_Data_Thread(threading.Thread):
 
     def run(self):
         while not self.is_stopped():
+            # Write batches to the track log outside of the lock, even while the feed is idle
+            if self.aircraft.track_log:
+                self.aircraft.track_log.flush_if_due()
+
             if len(self.data_queue) == 0:
                 continue
 
@@ -200,6 +350,10 @@ class Process_Data_Thread(threading.Thread):
             with AIRCRAFT_DICT_LOCK:
                 self.aircraft.process_msg(msg)
 
+        # Write whatever is left once the thread is stopped
+        if self.aircraft.track_log:
+            self.aircraft.track_log.flush()
+
     def stop(self):
         self.exit_flag.set()
 
@@ -208,6 +362,8 @@ class Process_Data_Thread(threading.Thread):
 
 
 def main():
+    # Only needed for the interactive table
+    from prettytable import PrettyTable
 
     rdl_soc = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     rdl_soc.connect(("10.0.0.64", 30003))
@@ -1,16 +1,26 @@
 from rpi_rgb_led_matrix.bindings.python.rgbmatrix import RGBMatrix, RGBMatrixOptions
-from static.static_map_generation import StaticMap
-from icons.icons import SmallFixedWingIcon
-import numpy as np
+from track_log import TrackLog
+from startup_timer import StartupTimer
+from concurrent.futures import ThreadPoolExecutor
+import aircraft_registry
 import data_processing
 from collections import deque
+from array import array
 import socket
-import geopy.distance
+import math
 import time
 import traceback
-from PIL import ImageDraw, ImageFont
+import pwd
 import os
 
+# numpy, PIL, geopy and the modules that depend on them are imported by the startup
+# stages so the placeholder frame can be shown before they are loaded, the query server
+# is imported only when it is enabled
+
+# Altitudes the aircraft colors are interpolated between
+KEY_ALTS = (0, 2000, 5000, 10000, 20000, 50000)
+KEY_DIFF = tuple(KEY_ALTS[i + 1] - KEY_ALTS[i] for i in range(len(KEY_ALTS) - 1))
+
 
 class FlightTrackerConfig:
     def __init__(self):
@@ -27,12 +37,19 @@ class FlightTrackerConfig:
         self.pixel_mapper_config: str = "U-mapper;Rotate:-90"
         self.rows_per_display: int = 64
         self.cols_per_display: int = 64
+        # RGBMatrix switches to the unprivileged daemon user once it is created, the track log and
+        # map cache directories are handed over to it. Set to False to keep running as root
+        self.drop_privileges: bool = True
 
         # Flight tracking configuration
         self.path_to_static_map: str = ""
         self.path_to_font: str = dir_path + "/static/font.ttf"
         self.path_to_runways: str = dir_path + "/static/runways.csv"
         self.path_to_icons_dir: str = dir_path + "/icons/SmallFixedWingIcons/"
+        self.path_to_large_icons_dir: str = dir_path + "/icons/LargeFixedWingIcons/"
+        self.path_to_rotorcraft_icons_dir: str = dir_path + "/icons/RotorcraftIcons/"
+        # Binary table built by aircraft_registry.py, an empty path disables it
+        self.path_to_registry: str = ""
         self.dump1090_host: str = "localhost"
         self.dump1090_port: int = 30003
         # Defualt to centering around BNA
@@ -42,6 +59,41 @@ class FlightTrackerConfig:
         self.mapping_box_height_mi: float = 50.0
         self.traces: bool = True
         self.callsign_labels = True
+        self.callsign_label_cache_size: int = 256
+
+        # Position history log, an empty path disables it
+        self.path_to_track_log: str = ""
+        self.track_log_retention_hours: float = 24.0
+        self.trace_restore_s: int = 300
+
+        # Traffic density layer drawn under the aircraft
+        self.heatmap: bool = False
+        self.heatmap_half_life_s: float = 7200.0
+        self.heatmap_decay_interval_s: float = 60.0
+
+        # Zoom levels are scales of the mapping box, zoom_level is the index of the starting level
+        self.zoom_levels: tuple[float, ...] = (0.5, 1.0, 2.0, 4.0)
+        self.zoom_level: int = 1
+        self.path_to_map_cache: str = ""
+        self.auto_zoom: bool = False
+        self.auto_zoom_min_aircraft: int = 3
+        self.auto_zoom_interval: int = 10
+
+        # Only track aircraft inside the display box plus a margin (the widest zoom level with auto_zoom),
+        # optionally limited to an altitude band
+        self.geofence: bool = True
+        self.geofence_margin_mi: float = 10.0
+        self.geofence_min_alt: int | None = None
+        self.geofence_max_alt: int | None = None
+
+        # Local HTTP server for querying the aircraft table, a socket path serves it on a Unix socket instead
+        self.query_server: bool = False
+        self.query_server_host: str = "127.0.0.1"
+        self.query_server_port: int = 8090
+        self.query_server_socket: str = ""
+
+        # Print how long each startup stage took once the first frame is drawn
+        self.startup_report: bool = True
 
 
 class FlightTracker:
@@ -49,6 +101,8 @@ class FlightTracker:
         self.config = config
         self.rows = config.total_rows
         self.cols = config.total_cols
+        self.timer = StartupTimer()
+        self.start_time = time.time()
 
         # Set up RGBMatrixOptions attributes
         self.display_config = RGBMatrixOptions()
@@ -61,8 +115,32 @@ class FlightTracker:
         self.display_config.parallel = config.parallel
         self.display_config.pixel_mapper_config = config.pixel_mapper_config
 
+        self.display_config.drop_privileges = config.drop_privileges
+
+        # Files, directories and sockets are created before the matrix, which may drop root privileges.
+        # Append-only log of aircraft positions
+        self.track_log = None
+        if config.path_to_track_log:
+            self.track_log = TrackLog(config.path_to_track_log)
+
+        if config.path_to_map_cache:
+            os.makedirs(config.path_to_map_cache, exist_ok=True)
+
+        # Files keep being created in these after the matrix drops privileges
+        if config.drop_privileges:
+            for path in (config.path_to_track_log, config.path_to_map_cache):
+                if path:
+                    self.give_to_matrix_user(path)
+
+        # Local aircraft registry for choosing icons
+        self.registry = None
+        if config.path_to_registry:
+            self.registry = aircraft_registry.AircraftRegistry(config.path_to_registry)
+
         # Aircraft table to record data on each aircraft
-        self.aircraft_table = data_processing.Aircraft_Table()
+        self.aircraft_table = data_processing.Aircraft_Table(
+            track_log=self.track_log, registry=self.registry
+        )
         self.data_queue = deque()
 
         # Socket for connecting to dump1090
@@ -74,11 +152,192 @@ class FlightTracker:
         self.process_data_thread = data_processing.Process_Data_Thread(
             self.aircraft_table, self.data_queue
         )
+
+        self.query_server_thread = None
+        if config.query_server:
+            with self.timer.stage("query server"):
+                # http.server pulls in a large import chain, only load it when the server is enabled
+                from query_server import Query_Server_Thread
+
+                self.query_server_thread = Query_Server_Thread(
+                    self.aircraft_table,
+                    config.query_server_host,
+                    config.query_server_port,
+                    config.query_server_socket,
+                )
+
+        # Create the matrix before anything slow so something is on the display while everything else loads
+        with self.timer.stage("matrix"):
+            self.matrix: RGBMatrix = RGBMatrix(options=self.display_config)
+
+            # Create two frame canvases for double buffering
+            self.canvas_0 = self.matrix.CreateFrameCanvas()
+            self.canvas_1 = self.matrix.CreateFrameCanvas()
+            self.use_second_canvas = False
+
+        self.show_placeholder()
+        self.timer.mark("placeholder frame")
+
         self.center_lat = config.base_latitude
         self.center_lon = config.base_longitude
         self.mapping_box_width = config.mapping_box_width_mi
         self.mapping_box_height = config.mapping_box_height_mi
 
+        self.zoom_level = config.zoom_level
+        self.requested_view = None
+        self.auto_zoom_candidate = None
+
+        self.traces = config.traces
+        self.callsign_labels = config.callsign_labels
+        self.first_aircraft_drawn = False
+
+        # Traffic density layer, created along with the static map
+        self.heatmap = None
+
+        # The static map, the icons and fonts, and the dump1090 connection don't depend
+        # on each other, load them at the same time
+        self.startup_pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="startup")
+        self.connect_future = self.startup_pool.submit(self.connect)
+        self.static_map_future = self.startup_pool.submit(self.load_static_map)
+        self.icons_future = self.startup_pool.submit(self.load_icons)
+
+    def give_to_matrix_user(self, path: str):
+        # Only root can change owners, and without root privileges there is nothing to drop
+        if os.geteuid() != 0:
+            return
+
+        user = pwd.getpwnam("daemon")
+
+        for dir_path, _, filenames in os.walk(path):
+            os.chown(dir_path, user.pw_uid, user.pw_gid)
+
+            for filename in filenames:
+                os.chown(os.path.join(dir_path, filename), user.pw_uid, user.pw_gid)
+
+    def show_placeholder(self):
+        # Crosshair at the base location, drawn directly on the canvas since PIL isn't loaded yet
+        canvas = self.canvas_0
+        canvas.Clear()
+
+        center_x = self.cols // 2
+        center_y = self.rows // 2
+        for offset in range(-3, 4):
+            canvas.SetPixel(center_x + offset, center_y, 64, 64, 64)
+            canvas.SetPixel(center_x, center_y + offset, 64, 64, 64)
+
+        self.matrix.SwapOnVSync(canvas)
+
+        # canvas_0 is on the display, draw the first frame on canvas_1
+        self.use_second_canvas = True
+
+    def connect(self):
+        with self.timer.stage("connect dump1090"):
+            self.rdl_soc.connect((self.config.dump1090_host, self.config.dump1090_port))
+            self.receive_data_thread.start()
+            self.process_data_thread.start()
+
+            if self.query_server_thread:
+                self.query_server_thread.start()
+
+    def load_static_map(self):
+        with self.timer.stage("import geopy"):
+            from static.map_pyramid import MapPyramid
+            import geopy
+
+        with self.timer.stage("static map"):
+            # Static maps for each zoom level, built lazily around the base location
+            self.map_pyramid = MapPyramid(
+                (self.mapping_box_height, self.mapping_box_width),
+                (self.rows, self.cols),
+                geopy.Point(self.center_lat, self.center_lon),
+                zoom_levels=self.config.zoom_levels,
+                runways_data_path=self.config.path_to_runways,
+                cache_dir=self.config.path_to_map_cache or None,
+            )
+            self.mapping_box_height, self.mapping_box_width = self.map_pyramid.dims_mi(self.zoom_level)
+
+            self.set_bounds()
+            self.update_geofence()
+
+            # Create the static map, RGBMatrix requires RGB image format
+            self.static_map = self.map_pyramid.get_blocking(self.zoom_level).image.convert("RGB")
+            self.set_background()
+
+            # Build the other zoom levels in the background so switching doesn't stall
+            self.map_pyramid.prefetch()
+
+        if self.track_log:
+            with self.timer.stage("restore traces"):
+                with data_processing.AIRCRAFT_DICT_LOCK:
+                    self.restore_traces(self.config.trace_restore_s)
+
+    def load_icons(self):
+        with self.timer.stage("import numpy/PIL"):
+            from icons.icons import SmallFixedWingIcon, LargeFixedWingIcon, RotorcraftIcon
+            from callsign_labels import LabelCache, LabelPlacer
+            from compositor import FrameCompositor
+            from PIL import ImageFont
+
+        with self.timer.stage("icons and font"):
+            self.icons = SmallFixedWingIcon(self.config.path_to_icons_dir) 
+
+            # Icons for each registry category, categories without icons use the small fixed wing icons
+            self.category_icons = {}
+            if os.path.isdir(self.config.path_to_large_icons_dir):
+                self.category_icons[aircraft_registry.CATEGORY_LARGE_FIXED_WING] = LargeFixedWingIcon(
+                    self.config.path_to_large_icons_dir
+                )
+
+            if os.path.isdir(self.config.path_to_rotorcraft_icons_dir):
+                self.category_icons[aircraft_registry.CATEGORY_ROTORCRAFT] = RotorcraftIcon(
+                    self.config.path_to_rotorcraft_icons_dir
+                )
+
+            self.font = ImageFont.truetype(self.config.path_to_font, 5)
+
+            # Pre-rendered callsign bitmaps and the label declutter pass
+            self.label_cache = LabelCache(self.font, self.config.callsign_label_cache_size)
+            self.label_placer = LabelPlacer((self.cols, self.rows))
+
+            self.compositor = FrameCompositor(self.rows, self.cols)
+
+    def set_background(self, old_bounds: tuple[float, float, float, float] | None = None):
+        import numpy as np
+        from heatmap import HeatmapLayer
+
+        self.static_map_array = np.asarray(self.static_map)
+
+        # The heatmap grid is in screen coordinates, move the accumulated counts into the new view
+        if self.heatmap and old_bounds:
+            self.heatmap.reproject(
+                self.static_map,
+                old_bounds,
+                (self.min_lat, self.max_lat, self.min_lon, self.max_lon),
+            )
+            return
+
+        self.heatmap = None
+        if self.config.heatmap:
+            self.heatmap = HeatmapLayer(
+                self.static_map,
+                half_life_s=self.config.heatmap_half_life_s,
+                decay_interval_s=self.config.heatmap_decay_interval_s,
+            )
+
+    def wait_for_startup(self):
+        # Re-raises any exception from the startup stages
+        self.connect_future.result()
+        self.static_map_future.result()
+        self.icons_future.result()
+        self.startup_pool.shutdown(wait=False)
+
+    def start_data_processing(self):
+        # The connection is started during __init__, wait for it
+        self.connect_future.result()
+
+    def set_bounds(self):
+        import geopy.distance
+
         # Calculate reference point to measure the position of aircraft in reference to
         dist_to_corner = (
             ((self.mapping_box_width / 2) ** 2) + ((self.mapping_box_height / 2) ** 2)
@@ -107,35 +366,169 @@ class FlightTracker:
             self.reference_point.longitude, self.opposite_reference_point.longitude
         )
 
-        self.icons = SmallFixedWingIcon(config.path_to_icons_dir) 
-        self.traces = config.traces
-        self.callsign_labels = config.callsign_labels
+    def update_geofence(self):
+        from static.map_pyramid import MILES_PER_DEG_LAT
 
-        self.font = ImageFont.truetype(config.path_to_font, 5)
+        if not self.config.geofence:
+            return
 
-        # Create the static map
-        self.static_map = StaticMap(
-            (self.mapping_box_height, self.mapping_box_width),
-            (self.rows, self.cols),
-            geopy.Point(self.center_lat, self.center_lon),
-            runways_data_path=config.path_to_runways,
-        ).image
-        
-        # RGBMatrix requires RGB image format
-        self.static_map.convert("RGB")
+        # With auto zoom, aircraft outside of the current view are needed to pick the zoom level
+        if self.config.auto_zoom:
+            levels = range(len(self.config.zoom_levels))
+            height_mi = max(self.map_pyramid.dims_mi(level)[0] for level in levels)
+            width_mi = max(self.map_pyramid.dims_mi(level)[1] for level in levels)
+        else:
+            height_mi = self.mapping_box_height
+            width_mi = self.mapping_box_width
+
+        miles_per_deg_lon = MILES_PER_DEG_LAT * max(0.01, math.cos(math.radians(self.center_lat)))
+        half_lat = (height_mi / 2 + self.config.geofence_margin_mi) / MILES_PER_DEG_LAT
+        half_lon = (width_mi / 2 + self.config.geofence_margin_mi) / miles_per_deg_lon
+
+        self.aircraft_table.geofence = data_processing.Geofence(
+            self.center_lat - half_lat,
+            self.center_lat + half_lat,
+            self.center_lon - half_lon,
+            self.center_lon + half_lon,
+            self.config.geofence_min_alt,
+            self.config.geofence_max_alt,
+        )
 
-        # Create matrix object
-        self.matrix: RGBMatrix = RGBMatrix(options=self.display_config)
+    def set_view(
+        self,
+        zoom_level: int | None = None,
+        center_lat: float | None = None,
+        center_lon: float | None = None,
+    ):
+        """
+        Request a new zoom level and/or center. The view switches on the next
+        frame that the static map for it is ready
+        """
+        if zoom_level is None:
+            zoom_level = self.zoom_level
 
-        # Create two frame canvases for double buffering
-        self.canvas_0 = self.matrix.CreateFrameCanvas()
-        self.canvas_1 = self.matrix.CreateFrameCanvas()
-        self.use_second_canvas = False
+        if center_lat is None:
+            center_lat = self.center_lat
 
-    def start_data_processing(self):
-        self.rdl_soc.connect((self.config.dump1090_host, self.config.dump1090_port))
-        self.receive_data_thread.start()
-        self.process_data_thread.start()
+        if center_lon is None:
+            center_lon = self.center_lon
+
+        import geopy
+
+        zoom_level = max(0, min(zoom_level, len(self.config.zoom_levels) - 1))
+        center = geopy.Point(center_lat, center_lon)
+
+        # Start building the map now if it isn't cached
+        self.map_pyramid.get(zoom_level, center)
+        self.requested_view = (zoom_level, center)
+
+    def update_view(self):
+        # Must be called with AIRCRAFT_DICT_LOCK held, traces are reprojected in place
+        if not self.requested_view:
+            return
+
+        zoom_level, center = self.requested_view
+        static_map = self.map_pyramid.get(zoom_level, center)
+
+        if static_map is None:
+            return
+
+        self.requested_view = None
+
+        old_bounds = (self.min_lat, self.max_lat, self.min_lon, self.max_lon)
+
+        self.zoom_level = zoom_level
+        self.center_lat = static_map.center_cord.latitude
+        self.center_lon = static_map.center_cord.longitude
+        self.mapping_box_height, self.mapping_box_width = self.map_pyramid.dims_mi(zoom_level)
+        self.set_bounds()
+        self.update_geofence()
+
+        # Only the aircraft traces are in screen coordinates, reproject them
+        for aircraft in self.aircraft_table.aircraft_table.values():
+            aircraft.pos_history = self.reproject_history(aircraft.pos_history, old_bounds)
+
+        restored = self.aircraft_table.restored_history
+        for hex_id in restored:
+            restored[hex_id] = self.reproject_history(restored[hex_id], old_bounds)
+
+        self.static_map = static_map.image.convert("RGB")
+        self.set_background(old_bounds)
+
+    def reproject_history(self, history: array, old_bounds: tuple[float, float, float, float]):
+        min_lat, max_lat, min_lon, max_lon = old_bounds
+        reprojected = array("i")
+
+        for i in range(0, len(history), 5):
+            lon = min_lon + (history[i] / self.cols) * (max_lon - min_lon)
+            lat = min_lat + ((self.rows - history[i + 1]) / self.rows) * (max_lat - min_lat)
+            pos = self.latlon_to_xy(lat, lon)
+
+            if pos[0] < 0 or pos[1] < 0:
+                continue
+
+            if len(reprojected) == 0 or reprojected[-5] != pos[0] or reprojected[-4] != pos[1]:
+                reprojected.extend(pos + tuple(history[i + 2 : i + 5]))
+
+        return reprojected
+
+    def auto_zoom(self):
+        from static.map_pyramid import MILES_PER_DEG_LAT
+
+        # Pick the closest zoom level that still shows enough aircraft
+        miles_per_deg_lon = MILES_PER_DEG_LAT * max(0.01, math.cos(math.radians(self.center_lat)))
+
+        distances = []
+        for aircraft in self.aircraft_table.aircraft_table.values():
+            if aircraft.latitude == 0.0 and aircraft.longitude == 0.0:
+                continue
+
+            distances.append(
+                (
+                    abs(aircraft.latitude - self.center_lat) * MILES_PER_DEG_LAT,
+                    abs(aircraft.longitude - self.center_lon) * miles_per_deg_lon,
+                )
+            )
+
+        zoom_levels = self.config.zoom_levels
+        candidate = max(range(len(zoom_levels)), key=lambda level: zoom_levels[level])
+        for level in sorted(range(len(zoom_levels)), key=lambda level: zoom_levels[level]):
+            height_mi, width_mi = self.map_pyramid.dims_mi(level)
+            half_height = height_mi / 2
+            half_width = width_mi / 2
+
+            count = sum(1 for lat_mi, lon_mi in distances if lat_mi <= half_height and lon_mi <= half_width)
+
+            if count >= self.config.auto_zoom_min_aircraft:
+                candidate = level
+                break
+
+        # Only switch once the same level has been picked twice in a row
+        if candidate != self.zoom_level and candidate == self.auto_zoom_candidate:
+            self.set_view(candidate)
+
+        self.auto_zoom_candidate = candidate
+
+    def restore_traces(self, seconds: int):
+        # Rebuild traces from the track log, they are attached when the aircraft is next seen.
+        # Only records from before startup, the current positions are still drawn as they arrive
+        restored = self.aircraft_table.restored_history
+        for record in self.track_log.query(self.start_time - seconds, self.start_time):
+            pos = self.latlon_to_xy(record.latitude, record.longitude)
+
+            if pos[0] < 0 or pos[1] < 0:
+                continue
+
+            history = restored.setdefault(record.hex_ident, array("i"))
+            if len(history) == 0 or history[-5] != pos[0] or history[-4] != pos[1]:
+                history.extend(pos + self.get_color_from_altitude(record.altitude))
+
+        # The data processing thread starts alongside this, attach the history of aircraft it already added
+        for hex_id, aircraft in self.aircraft_table.aircraft_table.items():
+            history = restored.pop(hex_id, None)
+
+            if history:
+                aircraft.pos_history = history + aircraft.pos_history
 
     """
         This is an extremely naive projection.
@@ -183,8 +576,8 @@ class FlightTracker:
     def get_color_from_altitude(self, alt):
         # colors = ((255, 0, 0), (255, 255, 0), (0, 255, 0), (0, 255, 255), (0, 255, 0), (255, 255, 0))
 
-        key_alts = np.array([0, 2000, 5000, 10000, 20000, 50000])
-        key_diff = key_alts[1:] - key_alts[:-1]
+        key_alts = KEY_ALTS
+        key_diff = KEY_DIFF
 
         # Color Order:
         #   (255, 0 to 255, 0)
@@ -231,96 +624,129 @@ class FlightTracker:
             return (var_channel, 0, 255)
 
     def generate_frame(self):
-        frame = self.static_map.copy()
-
-        frame_draw = ImageDraw.Draw(frame)
+        if self.heatmap:
+            self.compositor.begin(self.heatmap.get_background())
+        else:
+            self.compositor.begin(self.static_map_array)
 
-        # variables to store the aircraft closest to device
+        # Visible aircraft and their positions, used for the callsign labels
+        visible = []
 
         for icao_code in self.aircraft_table.aircraft_table.keys():
             aircraft = self.aircraft_table.aircraft_table[icao_code]
             pos = self.latlon_to_xy(aircraft.latitude, aircraft.longitude)
 
             if pos[0] >= 0 and pos[1] >= 0:
-                self.draw_aircraft(pos[0], pos[1], frame_draw, aircraft)
-
-                if self.callsign_labels:
-                    self.draw_callsign_labels(aircraft, frame_draw)
-
-        return frame
-
-    def draw_aircraft(self, x_pos, y_pos, frame_draw: ImageDraw.ImageDraw, aircraft):
-        # Call method to get the color of the aircraft icon based on the altitude of the aircraft
-        color = self.get_color_from_altitude(aircraft.altitude)
+                self.draw_aircraft(pos[0], pos[1], aircraft)
+                visible.append((pos, aircraft))
 
+        # Traces first so the icons are drawn on top of them
+        self.compositor.draw_traces()
+        self.compositor.draw_icons()
 
-        prev_point = None
-        for point in aircraft.pos_history:
-            point_pos = point[0]
-            point_color = point[1]
+        if self.heatmap and visible:
+            self.heatmap.add([item[0] for item in visible])
 
-            if prev_point: 
-                x_diff = abs(prev_point[1] - point_pos[1]) 
-                y_diff = abs(prev_point[0] - point_pos[0])
+        if visible and not self.first_aircraft_drawn:
+            self.first_aircraft_drawn = True
+            elapsed = self.timer.mark("first aircraft")
 
-                if x_diff > 1 or y_diff > 1:
-                    frame_draw.line((prev_point, point_pos), point_color)
+            if self.config.startup_report:
+                print(f"First aircraft displayed {elapsed:.3f}s after startup")
 
-                else:
-                    frame_draw.point(point_pos, point_color)
+        if self.callsign_labels:
+            self.draw_callsign_labels(visible)
 
-            else:
-                frame_draw.point(point_pos, point_color)
+        return self.compositor.get_image()
 
-            prev_point = point_pos
+    def draw_aircraft(self, x_pos, y_pos, aircraft):
+        # Call method to get the color of the aircraft icon based on the altitude of the aircraft
+        color = self.get_color_from_altitude(aircraft.altitude)
 
-        if prev_point:
-            x_diff = abs(prev_point[1] - x_pos)
-            y_diff = abs(prev_point[0] - y_pos)
 
-            if x_diff > 1 or y_diff > 1:
-                frame_draw.line((prev_point, (x_pos, y_pos)), color)
+        self.compositor.add_trace(aircraft.pos_history, (x_pos, y_pos), color)
 
-        self.icons.plot_icon((x_pos, y_pos), color, aircraft.track, frame_draw)
+        icons = self.category_icons.get(aircraft.category, self.icons)
+        self.compositor.add_icon(icons, (x_pos, y_pos), color, aircraft.track)
 
 
         if (
             len(aircraft.pos_history) == 0
-            or x_pos != aircraft.pos_history[-1][0][0]
-            or y_pos != aircraft.pos_history[-1][0][1]
+            or x_pos != aircraft.pos_history[-5]
+            or y_pos != aircraft.pos_history[-4]
         ):
-            aircraft.pos_history.append(((x_pos, y_pos), color))
-
-
-        return frame_draw
+            aircraft.pos_history.extend((x_pos, y_pos) + color)
 
     def draw_callsign_labels(
-        self, aircraft: data_processing.Aircraft, frame_draw: ImageDraw.ImageDraw
+        self,
+        visible: list[tuple[tuple[int, int], data_processing.Aircraft]],
     ):
-        anchor_pos = self.latlon_to_xy(aircraft.latitude, aircraft.longitude)
-        txt = aircraft.call_sign.strip(' ')
-        frame_draw.text(anchor_pos, txt, (255, 255, 255), self.font, anchor="rs")
+        center_x = self.cols // 2
+        center_y = self.rows // 2
+
+        # Aircraft closest to the center of the display get labeled first
+        visible = sorted(
+            visible,
+            key=lambda item: (item[0][0] - center_x) ** 2 + (item[0][1] - center_y) ** 2,
+        )
+
+        labels = []
+        for pos, aircraft in visible:
+            call_sign = aircraft.call_sign.strip(" ")
+
+            # Nothing to draw, and the cache doesn't keep misses
+            if not call_sign:
+                continue
 
-        return frame_draw
+            label = self.label_cache.get(call_sign)
+
+            if label is not None:
+                labels.append((pos, label))
+
+        obstacles = [pos for pos, _ in visible]
+        for corner, label in self.label_placer.place(labels, obstacles):
+            self.compositor.draw_mask(corner, label, (255, 255, 255))
 
     def run_display(self):
+        # The placeholder frame stays up until the static map and icons are loaded
+        self.wait_for_startup()
+        self.timer.mark("first frame")
+
+        if self.config.startup_report:
+            print(self.timer.report())
+
         count = 0
         while True:
             with data_processing.AIRCRAFT_DICT_LOCK:
+                if self.config.auto_zoom and count % self.config.auto_zoom_interval == 0:
+                    self.auto_zoom()
+
+                self.update_view()
                 self.matrix.SwapOnVSync(self.create_canvas())
 
                 if count == 60:
                     self.aircraft_table.purge_old_aircraft()
-                    count = 0
+
+            if count == 60:
+                if self.track_log:
+                    self.track_log.prune(self.config.track_log_retention_hours)
+                count = 0
             count += 1
             time.sleep(1)
 
     def shutdown(self):
+        self.startup_pool.shutdown(wait=False, cancel_futures=True)
         self.receive_data_thread.stop()
         self.process_data_thread.stop()
         self.receive_data_thread.join()
         self.process_data_thread.join()
 
+        if self.query_server_thread:
+            self.query_server_thread.stop()
+
+        if self.registry:
+            self.registry.close()
+
 
 if __name__ == "__main__":
     config = FlightTrackerConfig()
@@ -0,0 +1,160 @@
+from PIL import Image
+import numpy as np
+import time
+
+"""
+    HeatmapLayer class:
+        - Accumulates where aircraft have been seen at panel resolution
+        - Counts decay exponentially, applied as a single multiply once per decay interval
+        - The grid is composited under the static map and the result is cached,
+          it is only re-rendered when the grid has changed noticeably
+        - Per frame cost depends only on the panel size and the number of
+          visible aircraft, not on how much history has been accumulated
+        - reproject() moves the accumulated counts into a new view when the zoom or center changes
+"""
+
+# Colormap stops, (grid level 0-255, (r, g, b)). Kept dim so aircraft and runways stand out
+COLORMAP_STOPS = (
+    (0, (0, 0, 0)),
+    (64, (0, 0, 48)),
+    (160, (48, 0, 64)),
+    (255, (96, 16, 0)),
+)
+
+
+class HeatmapLayer:
+    def __init__(
+        self,
+        static_map: Image.Image,
+        half_life_s: float = 7200.0,
+        decay_interval_s: float = 60.0,
+        change_threshold: float = 0.05,
+    ):
+        self.set_static_map(static_map)
+
+        self.grid = np.zeros((self.rows, self.cols), dtype=np.float32)
+        self.total = 0.0
+
+        self.decay_interval_s = decay_interval_s
+        self.decay_factor = np.float32(0.5 ** (decay_interval_s / half_life_s))
+        self.last_decay = time.time()
+
+        # Mass added plus mass decayed since the last render. The net total can stay flat
+        # while traffic moves, so the change itself is tracked
+        self.change_threshold = change_threshold
+        self.changed = 0.0
+        self.colormap = self._build_colormap()
+        self.background = self.static_map
+
+    def add(self, positions: list[tuple[int, int]]):
+        if len(positions) == 0:
+            return
+
+        xy = np.array(positions, dtype=np.intp)
+        np.add.at(self.grid, (xy[:, 1], xy[:, 0]), 1.0)
+        self.total += len(positions)
+        self.changed += len(positions)
+
+    def decay(self):
+        cur_time = time.time()
+
+        if cur_time - self.last_decay < self.decay_interval_s:
+            return
+
+        # Apply every missed interval at once
+        intervals = int((cur_time - self.last_decay) // self.decay_interval_s)
+        factor = self.decay_factor**intervals
+
+        self.grid *= factor
+        self.changed += self.total * (1.0 - float(factor))
+        self.total *= float(factor)
+        self.last_decay += intervals * self.decay_interval_s
+
+    def set_static_map(self, static_map: Image.Image):
+        self.static_map = np.asarray(static_map.convert("RGB"))
+        self.rows, self.cols = self.static_map.shape[:2]
+
+        # Only draw the static map where it has content, the heatmap shows through elsewhere
+        self.static_mask = self.static_map.any(axis=2)
+
+    def reproject(
+        self,
+        static_map: Image.Image,
+        old_bounds: tuple[float, float, float, float],
+        new_bounds: tuple[float, float, float, float],
+    ):
+        """
+        Moves the grid to a new view. Bounds are (min_lat, max_lat, min_lon, max_lon)
+        """
+        self.set_static_map(static_map)
+
+        old_min_lat, old_max_lat, old_min_lon, old_max_lon = old_bounds
+        new_min_lat, new_max_lat, new_min_lon, new_max_lon = new_bounds
+
+        # Size of an old pixel measured in new pixels
+        scale_x = (old_max_lon - old_min_lon) / (new_max_lon - new_min_lon)
+        scale_y = (old_max_lat - old_min_lat) / (new_max_lat - new_min_lat)
+
+        old_grid = self.grid
+        self.grid = np.zeros((self.rows, self.cols), dtype=np.float32)
+
+        if scale_x * scale_y <= 1.0:
+            # Zooming out, several old pixels fold into each new pixel
+            ys, xs = np.nonzero(old_grid)
+            lons = old_min_lon + (xs + 0.5) / self.cols * (old_max_lon - old_min_lon)
+            lats = old_min_lat + (self.rows - ys - 0.5) / self.rows * (old_max_lat - old_min_lat)
+
+            new_xs = np.floor((lons - new_min_lon) / (new_max_lon - new_min_lon) * self.cols).astype(np.intp)
+            new_ys = self.rows - 1 - np.floor((lats - new_min_lat) / (new_max_lat - new_min_lat) * self.rows).astype(np.intp)
+
+            valid = (new_xs >= 0) & (new_xs < self.cols) & (new_ys >= 0) & (new_ys < self.rows)
+            np.add.at(self.grid, (new_ys[valid], new_xs[valid]), old_grid[ys[valid], xs[valid]])
+        else:
+            # Zooming in, each old pixel is spread over several new pixels
+            ys, xs = np.indices((self.rows, self.cols))
+            lons = new_min_lon + (xs + 0.5) / self.cols * (new_max_lon - new_min_lon)
+            lats = new_min_lat + (self.rows - ys - 0.5) / self.rows * (new_max_lat - new_min_lat)
+
+            old_xs = np.floor((lons - old_min_lon) / (old_max_lon - old_min_lon) * self.cols).astype(np.intp)
+            old_ys = self.rows - 1 - np.floor((lats - old_min_lat) / (old_max_lat - old_min_lat) * self.rows).astype(np.intp)
+
+            valid = (old_xs >= 0) & (old_xs < self.cols) & (old_ys >= 0) & (old_ys < self.rows)
+            self.grid[valid] = old_grid[old_ys[valid], old_xs[valid]] / (scale_x * scale_y)
+
+        self.total = float(self.grid.sum())
+        self.background = self.render()
+        self.changed = 0.0
+
+    def get_background(self) -> np.ndarray:
+        self.decay()
+
+        if self.changed > self.change_threshold * max(self.total, 1.0):
+            self.background = self.render()
+            self.changed = 0.0
+
+        return self.background
+
+    def render(self) -> np.ndarray:
+        peak = self.grid.max()
+
+        if peak <= 0:
+            levels = np.zeros(self.grid.shape, dtype=np.uint8)
+        else:
+            # Log scale so a few busy approach paths don't wash out everything else
+            levels = (np.log1p(self.grid) * (255 / np.log1p(peak))).astype(np.uint8)
+
+        frame = self.colormap[levels]
+        frame[self.static_mask] = self.static_map[self.static_mask]
+
+        return frame
+
+    def _build_colormap(self) -> np.ndarray:
+        stop_levels = [stop[0] for stop in COLORMAP_STOPS]
+        levels = np.arange(256)
+
+        colormap = np.zeros((256, 3), dtype=np.uint8)
+        for channel in range(3):
+            channel_stops = [stop[1][channel] for stop in COLORMAP_STOPS]
+            colormap[:, channel] = np.interp(levels, stop_levels, channel_stops)
+
+        return colormap
@@ -1,4 +1,5 @@
 from PIL import Image, ImageDraw
+import numpy as np
 
 """
     AircraftIcon class - parent of all aircraft icons
@@ -11,6 +12,8 @@ from PIL import Image, ImageDraw
 class AircraftIcon:
     def __init__(self):
         self.icons: list[Image.Image] = []
+        # (y offsets, x offsets, alpha) of the drawn pixels of each icon, relative to the icon center
+        self.icon_masks: list[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
         self.headings: list[int] = [0, 45, 90, 135, 180, 225, 270, 315]
 
     def load_icons(self, icons_dir: str):
@@ -31,6 +34,7 @@ class AircraftIcon:
                 icon.convert("1")
 
                 self.icons.append(icon)
+                self.icon_masks.append(self._icon_to_mask(icon))
 
     def plot_icon(
         self,
@@ -44,7 +48,7 @@ class AircraftIcon:
             print("Invalid Heading, Aircraft not added")
             return
 
-        icon = self._heading_to_icons(heading)
+        icon = self.icons[self.heading_index(heading)]
 
         icon_pos = (pos[0] - (icon.size[0]//2), pos[1] - (icon.size[1]//2))
 
@@ -52,7 +56,7 @@ class AircraftIcon:
 
 
         
-    def _heading_to_icons(self, heading: int):
+    def heading_index(self, heading: int) -> int:
         min_diff = 360
         min_ind = 0
 
@@ -63,7 +67,22 @@ class AircraftIcon:
                 min_diff = diff
                 min_ind = i
 
-        return self.icons[min_ind]
+        return min_ind
+
+    def _icon_to_mask(self, icon: Image.Image):
+        # Same mask ImageDraw.bitmap uses, the alpha channel if there is one
+        if icon.mode in ("RGBA", "LA"):
+            alpha = np.asarray(icon.getchannel("A"))
+        else:
+            alpha = np.asarray(icon.convert("L"))
+
+        ys, xs = np.nonzero(alpha)
+
+        return (
+            (ys - icon.size[1] // 2).astype(np.int32),
+            (xs - icon.size[0] // 2).astype(np.int32),
+            alpha[ys, xs].astype(np.uint16),
+        )
 
 class SmallFixedWingIcon(AircraftIcon):
     def __init__(self, icons_dir: str):
@@ -0,0 +1,166 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import data_processing
+import json
+import os
+import socket
+import threading
+
+"""
+    Query_Server_Thread class:
+        - Serves the aircraft table as compact JSON over localhost HTTP or a Unix socket
+        - GET /aircraft - full snapshot
+        - GET /aircraft?since=N - only the aircraft updated and removed since sequence number N
+        - Responses carry the table sequence number as the ETag, a matching If-None-Match gets a 304
+        - The table is copied under AIRCRAFT_DICT_LOCK, JSON encoding happens outside of it.
+          Full snapshots are cached per sequence number so clients polling at high rates share one encode
+"""
+
+# Order of the fields in each aircraft row, matches Aircraft.serialize()
+AIRCRAFT_FIELDS = (
+    "hex_ident",
+    "call_sign",
+    "altitude",
+    "ground_speed",
+    "track",
+    "latitude",
+    "longitude",
+    "squawk",
+    "on_ground",
+)
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        # Remove a stale socket left behind by a previous run
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+        self.socket.bind(self.server_address)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+class Query_Server_Thread(threading.Thread):
+    def __init__(
+        self,
+        aircraft: data_processing.Aircraft_Table,
+        host: str = "127.0.0.1",
+        port: int = 8090,
+        unix_socket_path: str = "",
+    ):
+        super().__init__(daemon=True)
+        self.aircraft = aircraft
+
+        # (seq, encoded body) of the last full snapshot
+        self.snapshot_cache: tuple[int, bytes] | None = None
+        self.snapshot_lock = threading.Lock()
+
+        handler = self._make_handler()
+        if unix_socket_path:
+            self.server = UnixHTTPServer(unix_socket_path, handler)
+        else:
+            self.server = ThreadingHTTPServer((host, port), handler)
+
+        self.server.daemon_threads = True
+
+    def run(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def snapshot(self, since: int = 0) -> tuple[int, bytes]:
+        """
+        Returns (seq, encoded JSON) of the aircraft changed since the sequence number since,
+        or of every aircraft if since is 0 or too old to list the removed aircraft
+        """
+        table = self.aircraft
+
+        if since == 0:
+            cached = self.snapshot_cache
+            if cached and cached[0] == table.seq:
+                return cached
+
+        # Copy only what is needed while holding the lock
+        with data_processing.AIRCRAFT_DICT_LOCK:
+            seq = table.seq
+            full = since == 0 or since < table.removed_floor or since > seq
+
+            rows = [
+                aircraft.serialize()
+                for aircraft in table.aircraft_table.values()
+                if full or aircraft.seq > since
+            ]
+
+            # An aircraft can be removed and seen again, it is then listed in rows instead
+            removed = []
+            if not full:
+                removed = [
+                    hex_id
+                    for removed_seq, hex_id in table.removed
+                    if removed_seq > since and hex_id not in table.aircraft_table
+                ]
+
+        body = json.dumps(
+            {
+                "seq": seq,
+                "since": 0 if full else since,
+                "full": full,
+                "fields": AIRCRAFT_FIELDS,
+                "aircraft": rows,
+                "removed": removed,
+            },
+            separators=(",", ":"),
+        ).encode()
+
+        if full:
+            with self.snapshot_lock:
+                if self.snapshot_cache is None or self.snapshot_cache[0] < seq:
+                    self.snapshot_cache = (seq, body)
+
+        return seq, body
+
+    def _make_handler(self):
+        server_thread = self
+
+        class QueryHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+
+                if url.path != "/aircraft":
+                    self.send_error(404)
+                    return
+
+                try:
+                    since = int(parse_qs(url.query).get("since", ["0"])[0])
+                except ValueError:
+                    self.send_error(400, "since must be an integer")
+                    return
+
+                # Nothing has changed since the client's last request
+                etag = f'"{server_thread.aircraft.seq}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+
+                seq, body = server_thread.snapshot(since)
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", f'"{seq}"')
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Clients poll at high rates, don't log every request
+                pass
+
+        return QueryHandler
@@ -0,0 +1,57 @@
+from contextlib import contextmanager
+import threading
+import time
+
+"""
+    StartupTimer class:
+        - Records how long each startup stage takes, including the deferred imports,
+          and when milestones (first frame, first aircraft) are reached
+        - Stages may run on different threads, each entry records the thread it ran on
+        - report() returns a table of every stage and milestone, relative to when the timer was created
+"""
+
+
+class StartupTimer:
+    def __init__(self):
+        self.start = time.perf_counter()
+        # (name, thread name, start offset, duration), milestones have a duration of None
+        self.entries: list[tuple[str, str, float, float | None]] = []
+        self.entries_lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        stage_start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            stage_end = time.perf_counter()
+
+            with self.entries_lock:
+                self.entries.append(
+                    (
+                        name,
+                        threading.current_thread().name,
+                        stage_start - self.start,
+                        stage_end - stage_start,
+                    )
+                )
+
+    def mark(self, name: str) -> float:
+        elapsed = time.perf_counter() - self.start
+
+        with self.entries_lock:
+            self.entries.append((name, threading.current_thread().name, elapsed, None))
+
+        return elapsed
+
+    def report(self) -> str:
+        with self.entries_lock:
+            entries = sorted(self.entries, key=lambda entry: entry[2])
+
+        lines = [f"{'Stage':<28}{'Thread':<20}{'Start (s)':>10}{'Time (s)':>10}"]
+        for name, thread_name, offset, duration in entries:
+            duration_str = f"{duration:.3f}" if duration is not None else "-"
+            lines.append(f"{name:<28}{thread_name:<20}{offset:>10.3f}{duration_str:>10}")
+
+        return "\n".join(lines)
@@ -0,0 +1,165 @@
+import math
+import os
+import queue
+import threading
+import traceback
+from geopy import Point
+from static.static_map_generation import StaticMap
+
+"""
+    MapPyramid class:
+        - Pre-rendered static maps for a set of zoom levels around the base location
+        - Each zoom level is a scale of the base mapping box, level centers are
+          snapped to a grid of tiles (a quarter of the box) so re-centering reuses maps
+        - Maps are built lazily on a background thread and cached in memory,
+          and on disk if cache_dir is set
+        - get() never blocks, it returns None and schedules a build if the map isn't ready
+"""
+
+MILES_PER_DEG_LAT = 69.0
+
+
+class MapPyramid:
+    def __init__(
+        self,
+        base_dims_mi: tuple[float, float],
+        dims_px: tuple[int, int],
+        base_center: Point,
+        zoom_levels: tuple[float, ...] = (0.5, 1.0, 2.0, 4.0),
+        runways_data_path: str = "runways.csv",
+        cache_dir: str | None = None,
+    ):
+        self.base_dims_mi = base_dims_mi
+        self.dims_px = dims_px
+        self.base_center = base_center
+        self.zoom_levels = zoom_levels
+        self.runways_data_path = runways_data_path
+        self.cache_dir = cache_dir
+
+        self.maps: dict[tuple[int, int, int], StaticMap] = {}
+        self.maps_lock = threading.Lock()
+
+        self.pending: set[tuple[int, int, int]] = set()
+        self.build_queue: queue.Queue = queue.Queue()
+        self.build_thread = threading.Thread(target=self._build_worker, daemon=True)
+        self.build_thread.start()
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def dims_mi(self, level: int) -> tuple[float, float]:
+        scale = self.zoom_levels[level]
+        return (self.base_dims_mi[0] * scale, self.base_dims_mi[1] * scale)
+
+    def key(self, level: int, center: Point | None = None) -> tuple[int, int, int]:
+        if center is None:
+            center = self.base_center
+
+        step_lat, step_lon = self._tile_step(level)
+
+        return (
+            level,
+            round((center.latitude - self.base_center.latitude) / step_lat),
+            round((center.longitude - self.base_center.longitude) / step_lon),
+        )
+
+    def get(self, level: int, center: Point | None = None) -> StaticMap | None:
+        key = self.key(level, center)
+
+        with self.maps_lock:
+            static_map = self.maps.get(key)
+
+            if static_map is None and key not in self.pending:
+                self.pending.add(key)
+                self.build_queue.put(key)
+
+        return static_map
+
+    def get_blocking(self, level: int, center: Point | None = None) -> StaticMap:
+        key = self.key(level, center)
+
+        with self.maps_lock:
+            static_map = self.maps.get(key)
+
+        if static_map is None:
+            static_map = self._build(key)
+
+        return static_map
+
+    def prefetch(self, center: Point | None = None):
+        for level in range(len(self.zoom_levels)):
+            self.get(level, center)
+
+    def _tile_step(self, level: int) -> tuple[float, float]:
+        height_mi, width_mi = self.dims_mi(level)
+        step_lat = (height_mi / 4) / MILES_PER_DEG_LAT
+
+        # Use the base latitude for the longitude step so tile centers stay on a fixed grid
+        miles_per_deg_lon = MILES_PER_DEG_LAT * max(
+            0.01, math.cos(math.radians(self.base_center.latitude))
+        )
+        step_lon = (width_mi / 4) / miles_per_deg_lon
+
+        return step_lat, step_lon
+
+    def _tile_center(self, key: tuple[int, int, int]) -> Point:
+        step_lat, step_lon = self._tile_step(key[0])
+
+        return Point(
+            self.base_center.latitude + key[1] * step_lat,
+            self.base_center.longitude + key[2] * step_lon,
+        )
+
+    def _cache_path(self, key: tuple[int, int, int]) -> str | None:
+        if not self.cache_dir:
+            return None
+
+        center = self._tile_center(key)
+        height_mi, width_mi = self.dims_mi(key[0])
+
+        filename = (
+            f"{center.latitude:.5f}_{center.longitude:.5f}_"
+            f"{height_mi:g}x{width_mi:g}mi_{self.dims_px[0]}x{self.dims_px[1]}px.png"
+        )
+
+        return os.path.join(self.cache_dir, filename)
+
+    def _build(self, key: tuple[int, int, int]) -> StaticMap:
+        cache_path = self._cache_path(key)
+        img_path = cache_path if cache_path and os.path.exists(cache_path) else None
+
+        static_map = StaticMap(
+            self.dims_mi(key[0]),
+            self.dims_px,
+            self._tile_center(key),
+            img_path=img_path,
+            runways_data_path=self.runways_data_path,
+        )
+        static_map.image.load()
+
+        if cache_path and not img_path:
+            static_map.image.save(cache_path)
+
+        with self.maps_lock:
+            self.maps[key] = static_map
+            self.pending.discard(key)
+
+        return static_map
+
+    def _build_worker(self):
+        while True:
+            key = self.build_queue.get()
+
+            with self.maps_lock:
+                already_built = key in self.maps
+
+            if already_built:
+                continue
+
+            try:
+                self._build(key)
+            except Exception:
+                traceback.print_exc()
+
+                with self.maps_lock:
+                    self.pending.discard(key)
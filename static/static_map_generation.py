@@ -30,6 +30,7 @@ class StaticMap:
 
     ):
         self.img_dims = map_dimensions_px
+        self.center_cord = center_cord
 
         self.runways_data_path = runways_data_path
        
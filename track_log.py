@@ -0,0 +1,233 @@
+import bisect
+import mmap
+import os
+import struct
+import threading
+import time
+
+"""
+    TrackLog class:
+        - Append-only binary log of aircraft positions, so traces survive an
+          aircraft being purged or the process restarting
+        - Records are fixed size (RECORD_STRUCT) and written in batches
+        - Files are segmented by hour, "<hour>.trk" holds the records and
+          "<hour>.idx" holds a small time index with one entry per batch
+        - Segments are memory-mapped for reading
+"""
+
+# timestamp, hex id, latitude, longitude, altitude, ground speed, track
+RECORD_STRUCT = struct.Struct("<dIffiHH")
+
+# timestamp of the first record in the batch, record number of the first record in the batch
+INDEX_STRUCT = struct.Struct("<dI")
+
+SECONDS_PER_SEGMENT = 3600
+
+
+class TrackRecord:
+    __slots__ = ("timestamp", "hex_ident", "latitude", "longitude", "altitude", "ground_speed", "track")
+
+    def __init__(
+        self,
+        timestamp: float,
+        hex_ident: str,
+        latitude: float,
+        longitude: float,
+        altitude: int,
+        ground_speed: int,
+        track: int,
+    ):
+        self.timestamp = timestamp
+        self.hex_ident = hex_ident
+        self.latitude = latitude
+        self.longitude = longitude
+        self.altitude = altitude
+        self.ground_speed = ground_speed
+        self.track = track
+
+
+class TrackLog:
+    def __init__(self, log_dir: str, batch_size: int = 256, flush_interval: float = 5.0):
+        self.log_dir = log_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        # (segment, packed record) pairs waiting to be written
+        self.pending: list[tuple[int, bytes]] = []
+        self.pending_lock = threading.Lock()
+        self.last_flush = time.time()
+
+        # Only one flush may append to a segment at a time, the index depends on the file size
+        self.flush_lock = threading.Lock()
+
+        os.makedirs(log_dir, exist_ok=True)
+
+    def append(
+        self,
+        hex_ident: str,
+        latitude: float,
+        longitude: float,
+        altitude: int,
+        ground_speed: int,
+        track: int,
+        timestamp: float | None = None,
+    ):
+        if timestamp is None:
+            timestamp = time.time()
+
+        try:
+            hex_int = int(hex_ident, 16)
+        except ValueError:
+            return
+
+        record = RECORD_STRUCT.pack(
+            timestamp,
+            hex_int,
+            latitude,
+            longitude,
+            altitude,
+            max(0, min(ground_speed, 0xFFFF)),
+            track % 360,
+        )
+
+        with self.pending_lock:
+            self.pending.append((int(timestamp // SECONDS_PER_SEGMENT), record))
+
+    def flush_if_due(self):
+        if len(self.pending) >= self.batch_size or (
+            self.pending and time.time() - self.last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        with self.flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self.pending_lock:
+            pending = self.pending
+            self.pending = []
+
+        self.last_flush = time.time()
+
+        if not pending:
+            return
+
+        # Split the batch at segment boundaries
+        batches: dict[int, list[bytes]] = {}
+        for segment, record in pending:
+            batches.setdefault(segment, []).append(record)
+
+        for segment, records in batches.items():
+            trk_path = self._segment_path(segment, "trk")
+
+            with open(trk_path, "ab") as trk_file:
+                # Drop a partial record left by a crash so the new records stay aligned
+                size = trk_file.tell()
+                record_num = size // RECORD_STRUCT.size
+                if size % RECORD_STRUCT.size:
+                    trk_file.truncate(record_num * RECORD_STRUCT.size)
+
+                trk_file.write(b"".join(records))
+
+            first_timestamp = RECORD_STRUCT.unpack_from(records[0])[0]
+            with open(self._segment_path(segment, "idx"), "ab") as idx_file:
+                size = idx_file.tell()
+                if size % INDEX_STRUCT.size:
+                    idx_file.truncate(size - size % INDEX_STRUCT.size)
+
+                idx_file.write(INDEX_STRUCT.pack(first_timestamp, record_num))
+
+    def query(self, start: float, end: float | None = None):
+        """
+        Yields every TrackRecord logged between start and end (unix timestamps)
+        """
+        if end is None:
+            end = time.time()
+
+        for segment in self.segments():
+            segment_start = segment * SECONDS_PER_SEGMENT
+            if segment_start + SECONDS_PER_SEGMENT < start or segment_start > end:
+                continue
+
+            yield from self._query_segment(segment, start, end)
+
+    def recent_aircraft(self, hours: float) -> set[str]:
+        """
+        Returns the hex ids of every aircraft logged in the last n hours
+        """
+        return {record.hex_ident for record in self.query(time.time() - hours * 3600)}
+
+    def segments(self) -> list[int]:
+        segments = []
+        for filename in os.listdir(self.log_dir):
+            name, ext = os.path.splitext(filename)
+            if ext == ".trk" and name.isdigit():
+                segments.append(int(name))
+
+        return sorted(segments)
+
+    def prune(self, max_age_hours: float):
+        oldest = int((time.time() - max_age_hours * 3600) // SECONDS_PER_SEGMENT)
+
+        for segment in self.segments():
+            if segment < oldest:
+                for ext in ("trk", "idx"):
+                    path = self._segment_path(segment, ext)
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def _query_segment(self, segment: int, start: float, end: float):
+        with open(self._segment_path(segment, "trk"), "rb") as trk_file:
+            try:
+                trk_map = mmap.mmap(trk_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty segment
+                return
+
+            with trk_map:
+                total_records = len(trk_map) // RECORD_STRUCT.size
+
+                # Ignore index entries past the end of the records, their batch was never fully written
+                index = [entry for entry in self._load_index(segment) if entry[1] < total_records]
+
+                # Batches are written in time order, start from the last batch that begins before start
+                first_record = 0
+                if index:
+                    batch = bisect.bisect_right([entry[0] for entry in index], start) - 1
+                    if batch > 0:
+                        first_record = index[batch][1]
+
+                for record_num in range(first_record, total_records):
+                    fields = RECORD_STRUCT.unpack_from(trk_map, record_num * RECORD_STRUCT.size)
+
+                    if fields[0] < start:
+                        continue
+
+                    if fields[0] > end:
+                        break
+
+                    yield TrackRecord(
+                        fields[0],
+                        f"{fields[1]:06X}",
+                        fields[2],
+                        fields[3],
+                        fields[4],
+                        fields[5],
+                        fields[6],
+                    )
+
+    def _load_index(self, segment: int) -> list[tuple[float, int]]:
+        idx_path = self._segment_path(segment, "idx")
+
+        if not os.path.exists(idx_path):
+            return []
+
+        with open(idx_path, "rb") as idx_file:
+            data = idx_file.read()
+
+        usable = len(data) - (len(data) % INDEX_STRUCT.size)
+        return list(INDEX_STRUCT.iter_unpack(data[:usable]))
+
+    def _segment_path(self, segment: int, ext: str) -> str:
+        return os.path.join(self.log_dir, f"{segment}.{ext}")